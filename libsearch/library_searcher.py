@@ -1,22 +1,88 @@
-import requests
+import asyncio
+import base64
+import json
+import time
+
+import httpx
+import orjson
+from cachetools import TTLCache
+
+# Guest JWTs last about 30 minutes; used when the token carries no usable exp claim
+JWT_TTL_SECONDS = 25 * 60
+# Refresh this long before the token's own exp claim
+JWT_EXPIRY_MARGIN_SECONDS = 60
+# How long identical searches are answered from memory
+SEARCH_CACHE_TTL_SECONDS = 5 * 60
+
+# Guest JWT shared by all LibSearchClient instances
+_jwt_cache = {"token": None, "expires_at": 0.0}
+# Serializes JWT refreshes so concurrent searches trigger a single fetch
+_jwt_lock = asyncio.Lock()
+
+# Parsed search responses keyed by the Primo query string
+_search_cache = TTLCache(maxsize=256, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+# Shared async client so JWT and search calls multiplex over one HTTP/2 connection
+_http = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    follow_redirects=True,
+    headers={'User-Agent': 'mcp-lib-search/0.1', 'Accept-Encoding': 'br, gzip'},
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+)
+
+
+def _jwt_lifetime(jwt):
+    """Return seconds until the JWT's exp claim (minus a margin), or the default TTL.
+
+    An exp that is already (nearly) past locally, e.g. through clock skew, also
+    falls back to the default TTL; a token the server really considers expired
+    is refreshed on its 401 instead of before every search.
+    """
+    try:
+        payload = jwt.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload))['exp']
+        lifetime = float(exp) - time.time() - JWT_EXPIRY_MARGIN_SECONDS
+    except (IndexError, KeyError, TypeError, ValueError):
+        return JWT_TTL_SECONDS
+    return lifetime if lifetime > 0 else JWT_TTL_SECONDS
+
+
+def _jwt_is_usable(rejected=None):
+    """Whether the cached JWT exists, has not expired and is not the rejected token."""
+    token = _jwt_cache["token"]
+    return token is not None and token != rejected and time.monotonic() < _jwt_cache["expires_at"]
 
 
 class LibSearchClient():
-    def __init__(self):
-        jwt = self.get_jwt()
-        jwt = jwt.replace('"', '')
-        self.headers = {
+    @classmethod
+    async def get_cached_jwt(cls, rejected=None):
+        if not _jwt_is_usable(rejected):
+            async with _jwt_lock:
+                # Another caller may have refreshed the token while we waited
+                if not _jwt_is_usable(rejected):
+                    jwt = (await cls.get_jwt()).replace('"', '')
+                    _jwt_cache["token"] = jwt
+                    _jwt_cache["expires_at"] = time.monotonic() + _jwt_lifetime(jwt)
+        return _jwt_cache["token"]
+
+    @staticmethod
+    def _auth_headers(jwt):
+        return {
             'Authorization': 'Bearer ' + jwt
         }
 
     @classmethod
-    def get_jwt(cls):
+    async def get_jwt(cls):
         s = 'https://86sjt-primo.hosted.exlibrisgroup.com.cn/primo_library/libweb/webservices/rest/v1/guestJwt/SJT?isGuest=true&lang=zh_CN&targetUrl=https%253A%252F%252F86sjt-primo.hosted.exlibrisgroup.com.cn%252Fprimo-explore%252Fsearch%253Fquery%253Dany%252Ccontains%252C%2525E9%252587%25258F%2525E5%2525AD%252590%2526tab%253Ddefault_tab%2526search_scope%253Dbook_journal%2526vid%253Dbook%2526offset%253D0&viewId=book'
 
-        rsp = requests.get(s)
+        rsp = await _http.get(s)
+        # Don't cache an error page as the token
+        rsp.raise_for_status()
         return rsp.text
 
-    def search(self, query, language=None, advanced=False):
+    async def search(self, query, language=None, advanced=False):
         if advanced:
             q = query
         else:
@@ -25,17 +91,25 @@ class LibSearchClient():
         if language and language.strip():
             q = f"{q},AND;facet_lang,exact,{language.strip()},AND"
 
+        cached = _search_cache.get(q)
+        if cached is not None:
+            return cached
+
         s = f'https://86sjt-primo.hosted.exlibrisgroup.com.cn/primo_library/libweb/webservices/rest/primo-explore/v1/pnxs?acTriggered=false&blendFacetsSeparately=false&citationTrailFilterByAvailability=true&getMore=0&inst=SJT&isCDSearch=false&lang=zh_CN&limit=10&newspapersActive=false&newspapersSearch=false&offset=0&otbRanking=false&pcAvailability=true&q={q}&qExclude=&qInclude=&refEntryActive=false&rtaLinks=true&scope=book_journal&searchInFulltextUserSelection=true&skipDelivery=Y&sort=rank&tab=default_tab&vid=book'
 
-        rsp = requests.get(s, headers=self.headers)
+        jwt = await self.get_cached_jwt()
+        rsp = await _http.get(s, headers=self._auth_headers(jwt))
+        if rsp.status_code == 401:
+            # Cached token was rejected; fetch a fresh one and retry once
+            jwt = await self.get_cached_jwt(rejected=jwt)
+            rsp = await _http.get(s, headers=self._auth_headers(jwt))
 
-        result = rsp.json()
-        import json
-        # formatted_rsp = json.dumps(result, indent=4, ensure_ascii=False)
-        # print(formatted_rsp)
+        result = orjson.loads(rsp.content)
+        if rsp.is_success:
+            _search_cache[q] = result
         return result
 
 
 if __name__ == '__main__':
     client = LibSearchClient()
-    client.search('python')
+    asyncio.run(client.search('python'))
@@ -1,85 +1,290 @@
 from __future__ import annotations
 
+import heapq
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+import ahocorasick
+from cachetools import TTLCache
 from fastmcp import FastMCP
 
 # Import the library search client
-from library_searcher import LibSearchClient
+from library_searcher import LibSearchClient, SEARCH_CACHE_TTL_SECONDS
 
 # Server name for MCP registry/clients
 mcp = FastMCP("Library Search Server", log_level="ERROR")
 
+_YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+_TOKEN_RE = re.compile(r'\b\w+\b')
 
-def _calculate_relevance_score(document: Dict[str, Any], query_terms: List[str]) -> float:
-    """Calculate relevance score for a document based on query terms.
-    
-    Scoring weights:
-    - Title Match: 3.0 points per matching term
-    - Subject Match: 2.5 points per matching term
-    - Author Match: 2.0 points per matching term
-    - Description Match: 1.0 point per matching term
-    - Availability Bonus: +1.5 points
-    - Recent Publication Bonus: +0.5 points (2015+), +0.75 points (2020+)
+# Query terms and phrases shorter than this are ignored for scoring
+_MIN_TERM_LENGTH = 2
+
+# Boolean operators that may end a clause of an advanced Primo query
+_BOOLEAN_OPERATORS = {'AND', 'OR', 'NOT'}
+
+# Extracted fields keyed by PNX record id; the same records recur across searches
+_fields_cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL_SECONDS)
+
+# Library search client shared by all tool calls, see _get_client()
+_CLIENT: Optional[LibSearchClient] = None
+
+
+def _get_client() -> LibSearchClient:
+    """Return the shared library search client, creating it on first use.
+
+    The client refreshes its guest JWT itself when it expires or is rejected.
     """
-    score = 0.0
-
-    # Helper function to safely extract text from nested structures
-    def extract_text(obj: Any) -> str:
-        if isinstance(obj, str):
-            return obj.lower()
-        elif isinstance(obj, list):
-            return ' '.join(str(item) for item in obj).lower()
-        elif isinstance(obj, dict):
-            return ' '.join(str(value) for value in obj.values()).lower()
-        return str(obj).lower() if obj else ""
-
-    # Extract document fields safely
-    try:
-        pnx = document.get('pnx', {})
-        display = pnx.get('display', {})
-        addata = pnx.get('addata', {})
-        search = pnx.get('search', {})
-        facets = pnx.get('facets', {})
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = LibSearchClient()
+    return _CLIENT
+
+
+def _query_phrases(query: str, advanced: bool) -> List[str]:
+    """Return the lowercased phrases the user is searching for.
+
+    Advanced queries are Primo syntax such as `title,contains,计算机,OR;sub,contains,量子,AND`,
+    where only the value part of each clause is searched text.
+    """
+    if not advanced:
+        return [query.lower()]
+
+    phrases = []
+    for clause in query.split(';'):
+        parts = clause.split(',', 2)
+        if len(parts) < 3:
+            # Not a field,operator,value clause; treat it as plain text
+            value = clause
+        else:
+            value = parts[2]
+            head, sep, operator = value.rpartition(',')
+            if sep and operator.strip().upper() in _BOOLEAN_OPERATORS:
+                value = head
+        value = value.strip().lower()
+        if value:
+            phrases.append(value)
+    return phrases
+
+
+def _build_term_matcher(query_terms: List[str]) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton that finds all query terms in a single pass over a text.
+
+    Each distinct term is stored with an integer payload of (term id, term length),
+    so matching never has to hash or measure the term strings again.
+    """
+    matcher = ahocorasick.Automaton()
+    for term in query_terms:
+        if len(term) < _MIN_TERM_LENGTH:  # Skip very short terms
+            continue
+        term_lower = term.lower()
+        if term_lower not in matcher:
+            matcher.add_word(term_lower, (len(matcher), len(term_lower)))
+    matcher.make_automaton()
+    return matcher
+
+
+def _matched_terms(matcher: ahocorasick.Automaton, text: str) -> Set[Tuple[int, int]]:
+    """Return the (term id, term length) pairs of the distinct query terms occurring in text."""
+    if not len(matcher) or not text:
+        return set()
+    return {term for _, term in matcher.iter(text)}
+
 
-        title_text = extract_text(display.get('title', ''))
-        author_text = extract_text(display.get('creator', '')) + ' ' + extract_text(addata.get('au', ''))
-        subject_text = extract_text(display.get('subject', '')) + ' ' + extract_text(facets.get('topic', ''))
-        description_text = extract_text(display.get('description', '')) + ' ' + extract_text(
-            search.get('description', ''))
+def _matched_length(matcher: ahocorasick.Automaton, text: str) -> int:
+    """Return the total length of the distinct query terms occurring in text."""
+    return sum(length for _, length in _matched_terms(matcher, text))
 
-        # Calculate field-based scores
-        for term in query_terms:
-            if len(term) < 2:  # Skip very short terms
-                continue
 
-            term_lower = term.lower()
+def _matched_weight(matcher: ahocorasick.Automaton, text: str, total_length: int) -> float:
+    """Return the summed weights of the distinct query terms occurring in text.
+
+    Each term is worth 1.0 plus its share of `total_length`, the summed length of
+    all query terms, so longer terms count more but no term counts less than 1.0.
+    """
+    return sum(1.0 + length / total_length for _, length in _matched_terms(matcher, text))
+
+
+def _extract_text(obj: Any) -> str:
+    """Safely extract lowercased text from nested structures."""
+    if isinstance(obj, str):
+        return obj.lower()
+    elif isinstance(obj, list):
+        return ' '.join(str(item) for item in obj).lower()
+    elif isinstance(obj, dict):
+        return ' '.join(str(value) for value in obj.values()).lower()
+    return str(obj).lower() if obj else ""
+
+
+def _safe_pnx(document: Any) -> Optional[Dict[str, Any]]:
+    """Return the document's PNX record if it has the shape scoring expects, else None."""
+    if not isinstance(document, dict):
+        return None
+    pnx = document.get('pnx')
+    if not isinstance(pnx, dict) or not isinstance(pnx.get('control'), dict):
+        return None
+    for section in ('display', 'addata', 'search', 'facets'):
+        if not isinstance(pnx.get(section, {}), dict):
+            return None
+    return pnx
 
-            # Title matches (highest weight)
-            if term_lower in title_text:
-                score += 3.0
 
-            # Subject matches
-            if term_lower in subject_text:
-                score += 2.5
+def _clean_field(field: Any) -> str:
+    """Join list values and stringify the rest, returning "" for empty values."""
+    if isinstance(field, list):
+        return ', '.join(str(item) for item in field if item)
+    return str(field) if field else ""
+
+
+def _extract_document_fields(pnx: Dict[str, Any]) -> Dict[str, str]:
+    """Extract the fields used for scoring and display from a PNX record, once.
+
+    Besides the display values, the result holds the lowercased `*_text` strings
+    that scoring matches against. Results are cached by record id, so a record
+    is only extracted again after it expires from the cache.
+
+    The record must have been validated by `_safe_pnx`.
+    """
+    record_id = _clean_field(pnx['control'].get('recordid'))
+    cached = _fields_cache.get(record_id) if record_id else None
+    if cached is not None:
+        return cached
+
+    display = pnx.get('display', {})
+    addata = pnx.get('addata', {})
+    search = pnx.get('search', {})
+    facets = pnx.get('facets', {})
+
+    fields = {
+        "record_id": record_id,
+        "title": _clean_field(display.get('title', '')),
+        "creator": _clean_field(display.get('creator', '')),
+        "au": _clean_field(addata.get('au', '')),
+        "publisher": _clean_field(display.get('publisher', '')),
+        "pub": _clean_field(addata.get('pub', '')),
+        "year": _clean_field(display.get('creationdate', '')) or _clean_field(addata.get('date', '')),
+        "language": _clean_field(display.get('language', '')),
+        "availability": _clean_field(display.get('avail', '')),
+        "subject": _clean_field(display.get('subject', '')),
+        "topic": _clean_field(facets.get('topic', '')),
+        "description": _clean_field(display.get('description', '')),
+        "search_description": _clean_field(search.get('description', '')),
+    }
+    fields["title_text"] = fields["title"].lower()
+    fields["subject_text"] = (fields["subject"] + ' ' + fields["topic"]).lower()
+    fields["author_text"] = (fields["creator"] + ' ' + fields["au"]).lower()
+    fields["description_text"] = (fields["description"] + ' ' + fields["search_description"]).lower()
+    fields["availability_text"] = fields["availability"].lower()
+
+    if record_id:
+        _fields_cache[record_id] = fields
+    return fields
+
+
+def _extract_field_arrays(extracted: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """Collect the scored fields of the extracted documents as parallel lists."""
+    field_arrays: Dict[str, List[str]] = {
+        "title": [], "subject": [], "author": [], "description": [], "availability": [], "year": [],
+    }
+    for fields in extracted:
+        field_arrays["title"].append(fields["title_text"])
+        field_arrays["subject"].append(fields["subject_text"])
+        field_arrays["author"].append(fields["author_text"])
+        field_arrays["description"].append(fields["description_text"])
+        field_arrays["availability"].append(fields["availability_text"])
+        field_arrays["year"].append(fields["year"])
+
+    return field_arrays
+
+
+def _shortlist_documents(
+        pnxs: List[Dict[str, Any]],
+        matcher: ahocorasick.Automaton,
+        limit: int
+) -> List[Dict[str, Any]]:
+    """Cheaply pick the PNX records worth full scoring.
+
+    The fields full scoring reads (title, creator and au, subject and topic,
+    the descriptions) are matched as one string per record, without the field
+    weights. The shortlist keeps the API's original order.
+    """
+    if len(pnxs) <= limit:
+        return pnxs
 
-            # Author matches
-            if term_lower in author_text:
-                score += 2.0
+    coarse_scores = []
+    for pnx in pnxs:
+        display = pnx.get('display', {})
+        addata = pnx.get('addata', {})
+        search = pnx.get('search', {})
+        facets = pnx.get('facets', {})
+        coarse_text = ' '.join((
+            _extract_text(display.get('title', '')),
+            _extract_text(display.get('creator', '')),
+            _extract_text(addata.get('au', '')),
+            _extract_text(display.get('subject', '')),
+            _extract_text(facets.get('topic', '')),
+            _extract_text(display.get('description', '')),
+            _extract_text(search.get('description', '')),
+        ))
+        coarse_scores.append(_matched_length(matcher, coarse_text))
+
+    shortlist = heapq.nlargest(limit, range(len(pnxs)), key=coarse_scores.__getitem__)
+    return [pnxs[i] for i in sorted(shortlist)]
+
+
+def _calculate_relevance_scores(
+        field_arrays: Dict[str, List[str]],
+        matcher: ahocorasick.Automaton,
+        phrases: List[str]
+) -> List[float]:
+    """Calculate relevance scores for all documents based on query terms.
+
+    The fields come from `_extract_field_arrays` and the query terms are given
+    as an automaton built by `_build_term_matcher`. `phrases` are the searched
+    phrases as returned by `_query_phrases`.
+
+    Each matching term is weighted by 1 + len(term) / (summed length of all
+    terms), so documents matching the longer parts of the query rank higher,
+    while any title match still outweighs the availability and year bonuses.
 
-            # Description matches
-            if term_lower in description_text:
-                score += 1.0
+    Scoring weights:
+    - Title Match: 3.0 points per matching term, times its weight
+    - Subject Match: 2.5 points per matching term, times its weight
+    - Author Match: 2.0 points per matching term, times its weight
+    - Description Match: 1.0 point per matching term, times its weight
+    - Exact Phrase in Title Bonus: +5.0 points (phrases of 2+ characters)
+    - Availability Bonus: +1.5 points
+    - Recent Publication Bonus: +0.5 points (2015+), +0.75 points (2020+)
+    """
+    titles = field_arrays["title"]
+    subjects = field_arrays["subject"]
+    authors = field_arrays["author"]
+    descriptions = field_arrays["description"]
+    availabilities = field_arrays["availability"]
+    years = field_arrays["year"]
+    total_length = sum(length for _, length in matcher.values()) if len(matcher) else 1
+    bonus_phrases = [phrase for phrase in phrases if len(phrase) >= _MIN_TERM_LENGTH]
+
+    scores = []
+    for i in range(len(titles)):
+        # Calculate length-weighted field scores, one automaton pass per field
+        score = (3.0 * _matched_weight(matcher, titles[i], total_length)
+                 + 2.5 * _matched_weight(matcher, subjects[i], total_length)
+                 + 2.0 * _matched_weight(matcher, authors[i], total_length)
+                 + 1.0 * _matched_weight(matcher, descriptions[i], total_length))
+
+        # Exact phrase bonus
+        if any(phrase in titles[i] for phrase in bonus_phrases):
+            score += 5.0
 
         # Availability bonus
-        availability = extract_text(display.get('avail', ''))
+        availability = availabilities[i]
         if 'available' in availability or 'online' in availability:
             score += 1.5
 
         # Publication year bonus
         try:
-            year_text = extract_text(display.get('creationdate', '')) or extract_text(addata.get('date', ''))
-            year_match = re.search(r'\b(19|20)\d{2}\b', year_text)
+            year_match = _YEAR_RE.search(years[i])
             if year_match:
                 year = int(year_match.group())
                 if year >= 2020:
@@ -89,39 +294,27 @@ def _calculate_relevance_score(document: Dict[str, Any], query_terms: List[str])
         except (ValueError, TypeError):
             pass
 
-    except Exception:
-        # If there's any error in scoring, return a minimal score
-        pass
+        scores.append(score)
 
-    return score
+    return scores
 
 
-def _format_search_result(document: Dict[str, Any], rank: Optional[int] = None, score: Optional[float] = None) -> str:
-    """Format a single search result for display."""
+def _format_search_result(fields: Dict[str, str], rank: Optional[int] = None, score: Optional[float] = None) -> str:
+    """Format a single search result for display from its extracted fields."""
     try:
-        pnx = document.get('pnx', {})
-        display = pnx.get('display', {})
-        addata = pnx.get('addata', {})
-        docId = pnx.get('control').get('recordid')
-
-        # Helper function to clean and format field values
-        def clean_field(field: Any) -> str:
-            if isinstance(field, list):
-                return ', '.join(str(item) for item in field if item)
-            return str(field) if field else "N/A"
-
-        title = clean_field(display.get('title', 'No title'))
-        author = clean_field(display.get('creator', '')) or clean_field(addata.get('au', ''))
-        publisher = clean_field(display.get('publisher', '')) or clean_field(addata.get('pub', ''))
-        year = clean_field(display.get('creationdate', '')) or clean_field(addata.get('date', ''))
-        language = clean_field(display.get('language', ''))
-        availability = clean_field(display.get('avail', ''))
-        subject = clean_field(display.get('subject', ''))
-        description = clean_field(display.get('description', ''))
+        docId = fields["record_id"]
+        title = fields["title"] or "No title"
+        author = fields["creator"] or fields["au"]
+        publisher = fields["publisher"] or fields["pub"]
+        year = fields["year"] or "N/A"
+        language = fields["language"] or "N/A"
+        availability = fields["availability"]
+        subject = fields["subject"]
+        description = fields["description"]
 
         # Extract year from date strings
         if year != "N/A":
-            year_match = re.search(r'\b(19|20)\d{2}\b', year)
+            year_match = _YEAR_RE.search(year)
             year = year_match.group() if year_match else year
 
         # Truncate long descriptions
@@ -151,7 +344,7 @@ def _format_search_result(document: Dict[str, Any], rank: Optional[int] = None,
 
 
 # @mcp.tool(description="Find the best matched library search results based on relevance scoring")
-def search_library_best_match(
+async def search_library_best_match(
         query: str,
         language: str = None,
         advanced: bool = False,
@@ -176,32 +369,38 @@ def search_library_best_match(
         max_results = 10
 
     try:
-        # Initialize library search client and perform search
-        client = LibSearchClient()
-        result = client.search(query, language, advanced)
-
-        # Extract documents from the response
-        docs = result.get('docs', [])
-        if not docs:
+        # Get the shared library search client and perform search
+        client = _get_client()
+        result = await client.search(query, language, advanced)
+
+        # Extract documents from the response, skipping malformed ones
+        docs = result.get('docs') or []
+        pnxs = [pnx for pnx in map(_safe_pnx, docs) if pnx is not None]
+        if not pnxs:
             return f"No results found for query: {query}"
 
         # Extract query terms for relevance scoring
-        query_terms = re.findall(r'\b\w+\b', query.lower())
+        phrases = _query_phrases(query, advanced)
+        query_text = ' '.join(phrases)
+        query_terms = _TOKEN_RE.findall(query_text)
+        matcher = _build_term_matcher(query_terms)
+
+        # Shortlist candidates with a coarse pass, then fully score only those
+        pnxs = _shortlist_documents(pnxs, matcher, 3 * max_results)
 
-        # Calculate relevance scores and sort
-        scored_docs = []
-        for doc in docs:
-            score = _calculate_relevance_score(doc, query_terms)
-            scored_docs.append((doc, score))
+        # Calculate relevance scores and sort; the extracted fields are reused for formatting
+        extracted = [_extract_document_fields(pnx) for pnx in pnxs]
+        field_arrays = _extract_field_arrays(extracted)
+        scores = _calculate_relevance_scores(field_arrays, matcher, phrases)
+        scored_docs = list(zip(extracted, scores))
 
-        # Sort by score (highest first) and take top results
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        top_results = scored_docs[:max_results]
+        # Take the top results by score (highest first) without sorting them all
+        top_results = heapq.nlargest(max_results, scored_docs, key=lambda x: x[1])
 
         # Format results
         formatted_results = []
-        for i, (doc, score) in enumerate(top_results, 1):
-            formatted_result = _format_search_result(doc, rank=i, score=score)
+        for i, (fields, score) in enumerate(top_results, 1):
+            formatted_result = _format_search_result(fields, rank=i, score=score)
             formatted_results.append(formatted_result)
 
         return '\n\n' + '\n\n'.join(formatted_results)
@@ -211,7 +410,7 @@ def search_library_best_match(
 
 
 # @mcp.tool(description="Search library and return multiple results ranked by relevance. You can use any keywords to search.")
-def simple_search_library_ranked(
+async def simple_search_library_ranked(
         query: str,
         max_results: int = 10
 ) -> str:
@@ -224,7 +423,7 @@ def simple_search_library_ranked(
     Returns:
         Formatted string with multiple results ranked by relevance score
     """
-    return search_library_best_match(query, None, False, max_results)
+    return await search_library_best_match(query, None, False, max_results)
 
 
 MCP_DESCRIPTION1 = '''
@@ -248,7 +447,7 @@ This tool is designed for precise retrieval of academic resources like books, ar
 @mcp.tool(
     description=MCP_DESCRIPTION
 )
-def advanced_search_library_ranked(
+async def advanced_search_library_ranked(
         primo_search_query: str,
         language: str | None = None,
         max_results: int = 10
@@ -263,7 +462,7 @@ def advanced_search_library_ranked(
     Returns:
         Formatted string with multiple results ranked by relevance score
     """
-    return search_library_best_match(primo_search_query, language, True, max_results)
+    return await search_library_best_match(primo_search_query, language, True, max_results)
 
 
 def main() -> None:
@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def clear_fields_cache():
+    main._fields_cache.clear()
+    yield
+    main._fields_cache.clear()
@@ -0,0 +1,73 @@
+import asyncio
+
+import main
+
+
+class FakeClient:
+    """Stands in for LibSearchClient, returning the given documents for any query."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def search(self, query, language=None, advanced=False):
+        return {"docs": self.docs}
+
+
+def make_doc(record_id, title, creator="", au="", subject="", topic="", description="",
+             avail="", year=""):
+    """Build a minimal Primo document with the PNX sections scoring reads."""
+    return {
+        "pnx": {
+            "control": {"recordid": [record_id]},
+            "display": {
+                "title": [title],
+                "creator": [creator] if creator else [],
+                "subject": [subject] if subject else [],
+                "description": [description] if description else [],
+                "avail": [avail] if avail else [],
+                "creationdate": [year] if year else [],
+            },
+            "addata": {"au": [au] if au else []},
+            "search": {},
+            "facets": {"topic": [topic] if topic else []},
+        }
+    }
+
+
+def search(monkeypatch, docs, query, max_results=1):
+    monkeypatch.setattr(main, "_CLIENT", FakeClient(docs))
+    return asyncio.run(main.search_library_best_match(query, max_results=max_results))
+
+
+def score_documents(docs, query):
+    phrases = main._query_phrases(query, False)
+    matcher = main._build_term_matcher(main._TOKEN_RE.findall(' '.join(phrases)))
+    extracted = [main._extract_document_fields(main._safe_pnx(doc)) for doc in docs]
+    return main._calculate_relevance_scores(main._extract_field_arrays(extracted), matcher, phrases)
+
+
+def test_title_match_beats_bonus_only_document(monkeypatch):
+    docs = [
+        make_doc("cooking", "Cooking for beginners", avail="Available in library", year="2022"),
+        make_doc("python", "Learning Python the hard way", avail="Checked out", year="1999"),
+    ]
+
+    bonus_only, title_match = score_documents(docs, "python programming handbook")
+    assert title_match > bonus_only
+
+    result = search(monkeypatch, docs, "python programming handbook")
+    assert "Title: Learning Python the hard way" in result
+    assert "Cooking for beginners" not in result
+
+
+def test_shortlist_reads_every_scored_field(monkeypatch):
+    docs = [make_doc(f"unrelated-{i}", f"Unrelated {i}") for i in range(5)]
+    docs.append(make_doc(
+        "knuth", "The art of computer programming",
+        au="Knuth, Donald E.", topic="Algorithms",
+        description="Knuth's survey of fundamental algorithms.",
+    ))
+
+    result = search(monkeypatch, docs, "knuth algorithms")
+    assert "Title: The art of computer programming" in result
+    assert "Unrelated" not in result
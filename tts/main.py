@@ -37,31 +37,53 @@ async def handle_list_tools() -> List[Tool]:
                 },
                 "required": ["text"]
             }
+        ),
+        Tool(
+            name="refresh_audio_devices",
+            description="refresh audio devices to pick up a newly connected output device",
+            inputSchema={
+                "type": "object",
+                "properties": {},
+            }
         )
     ]
 
 
 async def play_audio(audio_data, audio_format):
+    import subprocess
     import tempfile
-    import os
     from pathlib import Path
 
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix=f'.{audio_format}', delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
-
-        # Play audio based on platform
+        # Play audio based on platform. Players run without a shell, and their
+        # stdout is discarded so it cannot corrupt the stdio MCP stream.
         if sys.platform == "darwin":  # macOS
-            os.system(f'afplay {temp_path}')
+            # afplay only plays files, so go through a temporary file
+            with tempfile.NamedTemporaryFile(suffix=f'.{audio_format}', delete=False) as temp_file:
+                temp_file.write(audio_data)
+                temp_path = temp_file.name
+            try:
+                subprocess.run(['afplay', temp_path], stdout=subprocess.DEVNULL, check=True)
+            finally:
+                Path(temp_path).unlink()
         elif sys.platform == "linux":
-            os.system(f'aplay {temp_path}')
+            # aplay reads the audio straight from stdin
+            subprocess.run(['aplay', '-q'], input=audio_data, stdout=subprocess.DEVNULL, check=True)
         elif sys.platform == "win32":
-            os.system(f'start {temp_path}')
-
-        # Cleanup
-        Path(temp_path).unlink()
+            if audio_format == "wav":
+                # winsound plays WAV data from memory and blocks until it is done
+                import winsound
+                winsound.PlaySound(audio_data, winsound.SND_MEMORY)
+            else:
+                # Other formats go through a temporary file and the associated player
+                with tempfile.NamedTemporaryFile(suffix=f'.{audio_format}', delete=False) as temp_file:
+                    temp_file.write(audio_data)
+                    temp_path = temp_file.name
+                try:
+                    subprocess.run(['cmd', '/c', 'start', '/wait', '', temp_path],
+                                   stdout=subprocess.DEVNULL, check=True)
+                finally:
+                    Path(temp_path).unlink()
     except Exception as e:
         print(f"Error playing audio: {e}", file=sys.stderr)
 
@@ -69,15 +91,27 @@ async def play_audio(audio_data, audio_format):
 async def text_to_speech(args: Dict[str, Any]) -> List[types.TextContent]:
     text = args["text"]
     speed = float(args.get("speed", 1.1))
-    tts.play_audio(text, speed)
+    await tts.play_audio(text, speed)
     return [types.TextContent(
         type="text",
         text="The audio is now playing",
     )]
 
 
+async def refresh_audio_devices(args: Dict[str, Any]) -> List[types.TextContent]:
+    if tts.refresh_audio_devices():
+        text = "Audio devices refreshed"
+    else:
+        text = "Audio is playing, try again when playback has finished"
+    return [types.TextContent(
+        type="text",
+        text=text,
+    )]
+
+
 tools = {
     "text_to_audio": text_to_speech,
+    "refresh_audio_devices": refresh_audio_devices,
 }
 
 
@@ -1,8 +1,14 @@
+import asyncio
 import io
-import hashlib
+import os
 import sys
+import tempfile
 from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
 
+import blake3
+import numpy as np
 import soundfile as sf
 import sounddevice as sd
 from kokoro_onnx import Kokoro
@@ -79,48 +85,201 @@ class LimitedCache:
 # Cache for storing samples (limit: 50 items, 50MB)
 _samples_cache = LimitedCache(max_items=50, max_memory_mb=50)
 
+# Persistent second tier behind _samples_cache, survives restarts
+DISK_CACHE_DIR = Path.home() / ".cache" / "mcp-tts"
+# Least recently used files are deleted beyond this size
+DISK_CACHE_MAX_MB = 500
+
+
+def _read_disk_cache(cache_key):
+    """Read (samples, sample_rate) from the disk cache, or None on a miss"""
+    path = DISK_CACHE_DIR / f'{cache_key}.wav'
+    if not path.exists():
+        return None
+    try:
+        cached = sf.read(path, dtype='float32')
+        # Bump the mtime so pruning treats this entry as recently used
+        os.utime(path)
+        return cached
+    except Exception as e:
+        print(f"Failed to read disk cache {path}: {e}", file=sys.stderr)
+        return None
+
+
+def _write_disk_cache(cache_key, samples, sample_rate):
+    """Write samples to the disk cache as a float WAV file"""
+    path = DISK_CACHE_DIR / f'{cache_key}.wav'
+    temp_path = None
+    try:
+        DISK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write to a unique temporary file first so readers never see a partial
+        # file and concurrent writers of the same key don't clash
+        with tempfile.NamedTemporaryFile(dir=DISK_CACHE_DIR, suffix='.tmp', delete=False) as temp_file:
+            temp_path = Path(temp_file.name)
+            sf.write(temp_file, samples, sample_rate, format='WAV', subtype='FLOAT')
+        temp_path.replace(path)
+        temp_path = None
+    except Exception as e:
+        print(f"Failed to write disk cache {path}: {e}", file=sys.stderr)
+    finally:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+    _prune_disk_cache()
+
+
+def _prune_disk_cache():
+    """Delete the least recently used files while the disk cache exceeds DISK_CACHE_MAX_MB"""
+    try:
+        entries = []
+        for path in DISK_CACHE_DIR.glob('*.wav'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Removed by a concurrent prune
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        max_bytes = DISK_CACHE_MAX_MB * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    except OSError as e:
+        print(f"Failed to prune disk cache {DISK_CACHE_DIR}: {e}", file=sys.stderr)
+
+
 print(kokoro.get_voices())
 
 
-def play_audio(text, speed=1.1):
+def _cache_key(text, speed):
+    """Cache key for the samples generated from text with the current voice and speed"""
+    # Fixed precision so e.g. 1.1 and 1.1000000001 share an entry
+    prefix = f'{voice}|{float(speed):.3f}|'.encode('utf-8')
+    return blake3.blake3(prefix + text.encode('utf-8')).hexdigest(length=16)
+
+
+# Serializes playback so overlapping requests play one after another
+_playback_lock = asyncio.Lock()
+
+
+async def play_audio(text, speed=1.1):
     # Create cache key
-    cache_key = hashlib.md5(text.encode()).hexdigest()
+    cache_key = _cache_key(text, speed)
 
-    # Check cache first
+    # Check memory cache first, then disk
     cached_samples = _samples_cache.get(cache_key)
+    if cached_samples is None:
+        cached_samples = await asyncio.to_thread(_read_disk_cache, cache_key)
+        if cached_samples is not None:
+            _samples_cache.put(cache_key, cached_samples)
     if cached_samples is not None:
         print(f"Cache hit for playback text: {text[:50]}...")
         samples, sample_rate = cached_samples
-    else:
-        # Generate samples if not in cache
-        print(f"Cache miss, generating samples for playback text: {text[:50]}...")
-        # append current time to text to avoid collision in cache during tests
-        samples, sample_rate = kokoro.create(text, voice, speed=speed)
-        # Store in cache
-        _samples_cache.put(cache_key, (samples, sample_rate))
-        print(f"Samples cache stats: {_samples_cache.stats()}")
+        # Play from a thread so the stdio MCP server keeps serving during playback
+        async with _playback_lock:
+            with _playing():
+                await asyncio.to_thread(sd.play, samples, sample_rate, blocking=True, device=get_current_output_device())
+        return None
 
-    sd.play(samples, sample_rate, blocking=True, device=get_current_output_device())
+    # Generate samples if not in cache, playing them as they are generated
+    print(f"Cache miss, generating samples for playback text: {text[:50]}...")
+    async with _playback_lock:
+        generated = await _stream_samples(text, speed)
+    if generated is None:
+        return None
+    samples, sample_rate = generated
+    # Store in cache
+    _samples_cache.put(cache_key, (samples, sample_rate))
+    # Writing and pruning touch the disk, so keep them off the event loop
+    await asyncio.to_thread(_write_disk_cache, cache_key, samples, sample_rate)
+    print(f"Samples cache stats: {_samples_cache.stats()}")
     return None
 
 
+async def _stream_samples(text, speed):
+    """Play Kokoro output chunk by chunk while the rest is still being generated.
+
+    Returns the concatenated (samples, sample_rate), or None if nothing was generated.
+    """
+    chunks = []
+    sample_rate = None
+    stream = None
+    with _playing():
+        try:
+            async for chunk, sample_rate in kokoro.create_stream(text, voice, speed=speed):
+                if stream is None:
+                    stream = sd.OutputStream(samplerate=sample_rate, channels=1, dtype='float32',
+                                             device=get_current_output_device())
+                    stream.start()
+                # Write from a thread so the generator keeps producing while this chunk plays
+                await asyncio.to_thread(stream.write, chunk)
+                chunks.append(chunk)
+        finally:
+            if stream is not None:
+                # stop() waits for the buffered audio to finish playing
+                await asyncio.to_thread(stream.stop)
+                stream.close()
+
+    if not chunks:
+        return None
+    return np.concatenate(chunks), sample_rate
+
+
+# Number of playbacks currently using PortAudio
+_active_playbacks = 0
+
+
+@contextmanager
+def _playing():
+    """Mark audio as playing, so refresh_audio_devices() won't tear PortAudio down"""
+    global _active_playbacks
+    _active_playbacks += 1
+    try:
+        yield
+    finally:
+        _active_playbacks -= 1
+
+
 def refresh_audio_devices():
-    """Refresh the audio devices list to detect newly connected devices"""
+    """Refresh the audio devices list to detect newly connected devices.
+
+    Returns False without refreshing while audio is playing.
+    """
+    global _output_device
+    if _active_playbacks:
+        print("Audio is playing, not refreshing audio devices", file=sys.stderr)
+        return False
     sd._terminate()
     sd._initialize()
-    print("Audio devices refreshed")
+    print("Audio devices refreshed", file=sys.stderr)
+    _output_device = _query_output_device()
+    return True
 
 
-def get_current_output_device():
-    """Get the current default output audio device"""
-    refresh_audio_devices()
-    default_device = sd.default.device
-    output_device = default_device[1]
-    device = sd.query_devices(output_device)
-    print('Current output device:', device['name'])
+def _query_output_device():
+    """Query the current default output audio device, or None to let PortAudio pick one"""
+    try:
+        default_device = sd.default.device
+        output_device = default_device[1]
+        device = sd.query_devices(output_device)
+    except (sd.PortAudioError, ValueError) as e:
+        print(f"No default output device found, using PortAudio's default: {e}", file=sys.stderr)
+        return None
+    print('Current output device:', device['name'], file=sys.stderr)
     return output_device
 
 
+def get_current_output_device():
+    """Get the default output audio device, as of import or the last refresh"""
+    return _output_device
+
+
+# Re-initializing PortAudio is slow, so the output device is only looked up
+# here and again when refresh_audio_devices() is called explicitly
+_output_device = _query_output_device()
+
+
 def test_sound(speed=1.1):
     text = "Hello, this is a test of the text to speech system."
     print("Playing audio...")
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import os
 from typing import Literal, Optional
+from urllib.parse import quote
 
-import requests
+import httpx
+from cachetools import TTLCache, cached
 from mcp.server.fastmcp import FastMCP
 
 # Server name for MCP registry/clients
@@ -11,10 +13,23 @@ mcp = FastMCP("Weather Server", log_level="ERROR")
 
 WTTR_BASE = os.environ.get("WTTR_BASE", "https://wttr.in")
 DEFAULT_TIMEOUT = float(os.environ.get("WTTR_TIMEOUT", "10"))
+CACHE_TTL = float(os.environ.get("WTTR_CACHE_TTL", "600"))
 
+# Recent wttr.in responses keyed by (city, unit); weather changes slowly and wttr.in rate-limits
+_wttr_cache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
 
+# Shared HTTP/2 client; keeps the connection to wttr.in alive between calls
+_client = httpx.Client(
+    http2=True,
+    timeout=DEFAULT_TIMEOUT,
+    follow_redirects=True,
+    headers={"User-Agent": "mcp-weather-server/0.1", "Accept-Encoding": "br, gzip"},
+)
+
+
+@cached(_wttr_cache, key=lambda city, unit: (city.lower(), unit))
 def _fetch_wttr(city: str, unit: Literal["metric", "imperial"]) -> dict:
-    """Fetch weather data from wttr.in as JSON.
+    """Fetch weather data from wttr.in as JSON, cached for CACHE_TTL seconds.
 
     Args:
         city: City name or query (e.g., "London", "San Francisco").
@@ -24,13 +39,13 @@ def _fetch_wttr(city: str, unit: Literal["metric", "imperial"]) -> dict:
         Parsed JSON dict from wttr.in (?format=j1).
 
     Raises:
-        requests.RequestException if HTTP fails or invalid status.
+        httpx.HTTPError if HTTP fails or invalid status.
         ValueError if JSON malformed.
     """
     # wttr.in JSON endpoint
-    url = f"{WTTR_BASE}/{requests.utils.quote(city)}"
+    url = f"{WTTR_BASE}/{quote(city)}"
     params = {"format": "j1"}
-    resp = requests.get(url, params=params, timeout=DEFAULT_TIMEOUT, headers={"User-Agent": "mcp-weather-server/0.1"})
+    resp = _client.get(url, params=params)
     resp.raise_for_status()
     data = resp.json()
     if not isinstance(data, dict):
@@ -119,14 +134,14 @@ def weather(
     try:
         data = _fetch_wttr(city, unit)
         return _format_current_summary(data)
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         status = getattr(e.response, "status_code", None)
         if status == 404:
             return f"City not found: {city}"
         return f"HTTP error from wttr.in: {e}"
-    except requests.Timeout:
+    except httpx.TimeoutException:
         return "Request to wttr.in timed out. Please try again later."
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Network error contacting wttr.in: {e}"
     except ValueError as e:
         return f"Unexpected response from wttr.in: {e}"